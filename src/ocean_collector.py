@@ -8,15 +8,149 @@ import os
 import json
 import sqlite3
 from dataclasses import dataclass, asdict, field
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from enum import Enum
 import uuid
 import argparse
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import orjson  # optional: C JSON encoder for CLI output and exports
+except ImportError:
+    orjson = None
 
 # Database setup
 DB_PATH = os.path.expanduser("~/.blackroad/ocean.db")
 
+# Join condition matching sensor s to its latest reading r, resolved through
+# sensors.last_reading_ts instead of one query per sensor
+_SQL_LATEST_READING_ON = '''r.id = (
+        SELECT id FROM readings
+        WHERE sensor_id = s.id AND timestamp = s.last_reading_ts
+        ORDER BY id DESC LIMIT 1)'''
+
+# Every sensor alongside its latest reading (NULL reading columns if none)
+_SQL_FLEET_LATEST = f'''SELECT s.id, s.name, s.type, s.lat, s.lon, s.depth_m, s.status,
+        r.sensor_id, r.temperature_c, r.salinity_psu, r.ph, r.dissolved_o2_mgl, r.current_ms, r.depth_m, r.timestamp
+    FROM sensors s
+    LEFT JOIN readings r ON {_SQL_LATEST_READING_ON}'''
+
+# Keys for the sensor columns of _SQL_FLEET_LATEST; the rest map to OceanReading
+_FLEET_SENSOR_KEYS = ('id', 'name', 'type', 'lat', 'lon', 'depth_m', 'status')
+
+# Static statements are hoisted here so every call passes the same SQL text
+# and hits the connection's prepared-statement cache. Templates containing
+# "{}" take a placeholder list from _placeholders().
+_SQL_COUNT_SENSORS = 'SELECT COUNT(*) FROM sensors'
+
+_SQL_INSERT_SENSOR = 'INSERT INTO sensors VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+
+_SQL_SENSOR_EXISTS = 'SELECT 1 FROM sensors WHERE id = ?'
+
+_SQL_SENSOR_DEPTHS = 'SELECT id, depth_m FROM sensors WHERE id IN ({})'
+
+_SQL_INSERT_READING = '''INSERT INTO readings (sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+
+# Only ever moves last_reading_ts forward, so backfilled history can't shadow newer readings
+_SQL_UPDATE_SENSOR_TS = '''UPDATE sensors SET last_reading_ts = MAX(COALESCE(last_reading_ts, 0), ?)
+    WHERE id = ?'''
+
+_SQL_LATEST = '''SELECT sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp
+    FROM readings WHERE sensor_id = ? ORDER BY timestamp DESC LIMIT 1'''
+
+_SQL_HISTORY = '''SELECT sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp
+    FROM readings WHERE sensor_id = ? AND timestamp > ? ORDER BY timestamp DESC'''
+
+_SQL_CLEAR_ANOMALIES = 'DELETE FROM anomalies'
+
+# Anomaly rules shared by the insert trigger and reclassify_all, in the order
+# the trigger raises them: (type, column, comparison, threshold, severity)
+_ANOMALY_RULES = (
+    ('high_temperature', 'temperature_c', '>', 30, 'warning'),
+    ('ocean_acidification', 'ph', '<', 7.8, 'critical'),
+    ('hypoxia', 'dissolved_o2_mgl', '<', 4, 'critical'),
+)
+
+_SQL_TRIGGER_RULE = '''
+    INSERT INTO anomalies (sensor_id, type, value, severity, timestamp)
+    SELECT NEW.sensor_id, '{0}', NEW.{1}, '{4}', NEW.timestamp
+    WHERE NEW.{1} {2} {3};'''
+
+_SQL_ANOMALY_TRIGGER = '''CREATE TRIGGER IF NOT EXISTS readings_anomaly_trigger AFTER INSERT ON readings
+BEGIN{}
+END'''.format(''.join(_SQL_TRIGGER_RULE.format(*rule) for rule in _ANOMALY_RULES))
+
+_SQL_RECLASSIFY_RULE = '''SELECT id AS reading_id, {0} AS type_rank, sensor_id,
+               '{1}' AS type, {2} AS value, '{5}' AS severity, timestamp
+        FROM readings WHERE {2} {3} {4}'''
+
+# Inserted in reading order, then in the trigger's per-reading type order,
+# so anomaly ids (used as tie-breakers) match live ingestion
+_SQL_RECLASSIFY_ANOMALIES = '''INSERT INTO anomalies (sensor_id, type, value, severity, timestamp)
+    SELECT sensor_id, type, value, severity, timestamp FROM (
+        {})
+    ORDER BY reading_id, type_rank'''.format('\n        UNION ALL\n        '.join(
+        _SQL_RECLASSIFY_RULE.format(rank, *rule) for rank, rule in enumerate(_ANOMALY_RULES)))
+
+_SQL_RECENT_ANOMALIES = '''SELECT sensor_id, type, value, severity, timestamp FROM anomalies
+    WHERE timestamp > ? ORDER BY timestamp DESC'''
+
+_SQL_COUNT_RECENT_ANOMALIES = 'SELECT COUNT(*) FROM anomalies WHERE timestamp > ?'
+
+# Three most recent anomalies per severity, most severe first
+_SQL_TOP_ANOMALIES_BY_SEVERITY = '''SELECT sensor_id, type, value, severity FROM (
+        SELECT sensor_id, type, value, severity, timestamp, id,
+               ROW_NUMBER() OVER (PARTITION BY severity ORDER BY timestamp DESC, id) AS rn
+        FROM anomalies
+        WHERE timestamp > ? AND severity IN ('critical', 'warning', 'info'))
+    WHERE rn <= 3
+    ORDER BY CASE severity WHEN 'critical' THEN 0 WHEN 'warning' THEN 1 ELSE 2 END,
+             timestamp DESC, id'''
+
+# Simplified heat content estimation: temperature * depth * 4186 / 1000 kJ/m²
+_SQL_HEAT_TOTAL = f'''SELECT SUM(r.temperature_c * r.depth_m * 4.186), COUNT(*)
+    FROM sensors s JOIN readings r ON {_SQL_LATEST_READING_ON}
+    WHERE s.id IN ({{}})'''
+
+_SQL_HEAT_BY_SENSOR = f'''SELECT s.id, r.temperature_c * r.depth_m * 4.186
+    FROM sensors s JOIN readings r ON {_SQL_LATEST_READING_ON}
+    WHERE s.id IN ({{}})'''
+
+_SQL_EXPORT_LATEST = f'''SELECT s.lat, s.lon, r.depth_m, r.temperature_c, r.salinity_psu, r.ph, r.dissolved_o2_mgl
+    FROM sensors s JOIN readings r ON {_SQL_LATEST_READING_ON}'''
+
+def _placeholders(n: int) -> str:
+    """Comma-separated "?" list for an IN clause of n values."""
+    return ",".join("?" * n)
+
+_US_PER_HOUR = 3_600_000_000
+
+def _now_us(_time=time.time) -> int:
+    """Current time as integer microseconds since the Unix epoch."""
+    return int(_time() * 1_000_000)
+
+def _iso(timestamp_us: int) -> str:
+    """Render an epoch-microsecond timestamp as a local ISO 8601 string."""
+    seconds, micros = divmod(timestamp_us, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros).isoformat()
+
+def _iso_to_us(timestamp: Optional[str]) -> Optional[int]:
+    """Parse a naive local ISO 8601 string into exact epoch microseconds."""
+    if timestamp is None:
+        return None
+    dt = datetime.fromisoformat(timestamp)
+    return int(dt.replace(microsecond=0).timestamp()) * 1_000_000 + dt.microsecond
+
+def _dumps_pretty(obj) -> str:
+    """Indented JSON for CLI output, encoded with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode()
+    return json.dumps(obj, indent=2, default=str, ensure_ascii=False)
+
 class SensorType(Enum):
     BUOY = "buoy"
     ARGO_FLOAT = "argo_float"
@@ -25,6 +159,9 @@ class SensorType(Enum):
     AUV = "auv"
     CTD = "ctd"
 
+_SENSOR_TYPE_LIST = tuple(t.value for t in SensorType)
+_SENSOR_TYPE_VALUES = frozenset(_SENSOR_TYPE_LIST)
+
 @dataclass
 class OceanSensor:
     id: str
@@ -34,10 +171,9 @@ class OceanSensor:
     lon: float
     depth_m: float
     status: str
-    last_reading_ts: str
+    last_reading_ts: Optional[int]
 
-@dataclass
-class OceanReading:
+class OceanReading(NamedTuple):
     sensor_id: str
     temperature_c: float
     salinity_psu: float
@@ -45,82 +181,208 @@ class OceanReading:
     dissolved_o2_mgl: float
     current_ms: float
     depth_m: float
-    timestamp: str
+    timestamp: int
+
+class ReadingBuffer:
+    """Queue of pending readings, written in batches by the collector."""
+    
+    def __init__(self, collector: "OceanDataCollector", batch_size: int):
+        self._collector = collector
+        self.batch_size = batch_size
+        self._pending: List[Tuple] = []
+        self._known_sensors = set()
+        self._flushes = 0
+    
+    def add(self, sensor_id: str, temp: float, salinity: float, ph: float,
+            o2: float, current: float = 0, depth: Optional[float] = None,
+            timestamp: Optional[int] = None):
+        """Queue a reading, flushing once the batch is full.
+        
+        timestamp is in epoch microseconds and defaults to now; pass it when
+        loading historical readings.
+        """
+        # Reject unknown sensors up front so one bad reading can't poison the batch
+        if sensor_id not in self._known_sensors:
+            if not self._collector._sensor_exists(sensor_id):
+                raise ValueError(f"Sensor {sensor_id} not found")
+            self._known_sensors.add(sensor_id)
+        
+        if timestamp is None:
+            timestamp = _now_us()
+        self._pending.append((sensor_id, temp, salinity, ph, o2, current, depth, timestamp))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write all queued readings in a single transaction.
+        
+        If the write fails (e.g. the database stays busy) the readings are put
+        back on the queue, so a later flush or the exit flush retries them.
+        """
+        if self._pending:
+            pending, self._pending = self._pending, []
+            try:
+                self._collector._write_readings(pending)
+            except BaseException:
+                self._pending = pending + self._pending
+                raise
+            self._flushes += 1
+            # Keep the WAL short under sustained ingest without blocking readers
+            if self._flushes % 10 == 0:
+                self._collector._checkpoint('PASSIVE')
 
 class OceanDataCollector:
     def __init__(self):
         self.db_path = DB_PATH
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
         self._init_db()
         self._initialize_demo_sensors()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with per-connection performance PRAGMAs applied."""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-64000')
+        conn.execute('PRAGMA mmap_size=268435456')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block of writes as one transaction on the shared connection."""
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute('BEGIN IMMEDIATE')
+            try:
+                yield c
+            except BaseException:
+                c.execute('ROLLBACK')
+                raise
+            c.execute('COMMIT')
+    
+    def _checkpoint(self, mode: str):
+        """Checkpoint the WAL into the database file (PASSIVE, FULL, RESTART or TRUNCATE)."""
+        with self._lock:
+            self._conn.execute(f'PRAGMA wal_checkpoint({mode})')
+    
+    def close(self):
+        """Close the shared database connection."""
+        with self._lock:
+            self._conn.close()
+    
     def _init_db(self):
         """Initialize SQLite database."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS sensors (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            type TEXT NOT NULL,
-            lat REAL NOT NULL,
-            lon REAL NOT NULL,
-            depth_m REAL NOT NULL,
-            status TEXT NOT NULL,
-            last_reading_ts TEXT
-        )''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sensor_id TEXT NOT NULL,
-            temperature_c REAL NOT NULL,
-            salinity_psu REAL NOT NULL,
-            ph REAL NOT NULL,
-            dissolved_o2_mgl REAL NOT NULL,
-            current_ms REAL NOT NULL,
-            depth_m REAL NOT NULL,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY(sensor_id) REFERENCES sensors(id)
-        )''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS anomalies (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sensor_id TEXT NOT NULL,
-            type TEXT NOT NULL,
-            value REAL NOT NULL,
-            severity TEXT NOT NULL,
-            timestamp TEXT NOT NULL,
-            FOREIGN KEY(sensor_id) REFERENCES sensors(id)
-        )''')
-        
-        conn.commit()
-        conn.close()
+        # WAL is persistent in the database file, so it only needs setting once
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction() as c:
+            legacy = self._detach_legacy_tables(c)
+            
+            c.execute('''CREATE TABLE IF NOT EXISTS sensors (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                type TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                depth_m REAL NOT NULL,
+                status TEXT NOT NULL,
+                last_reading_ts INTEGER
+            )''')
+            
+            c.execute('''CREATE TABLE IF NOT EXISTS readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sensor_id TEXT NOT NULL,
+                temperature_c REAL NOT NULL,
+                salinity_psu REAL NOT NULL,
+                ph REAL NOT NULL,
+                dissolved_o2_mgl REAL NOT NULL,
+                current_ms REAL NOT NULL,
+                depth_m REAL NOT NULL,
+                timestamp INTEGER NOT NULL,
+                FOREIGN KEY(sensor_id) REFERENCES sensors(id)
+            )''')
+            
+            c.execute('''CREATE TABLE IF NOT EXISTS anomalies (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sensor_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value REAL NOT NULL,
+                severity TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                FOREIGN KEY(sensor_id) REFERENCES sensors(id)
+            )''')
+            
+            if legacy:
+                self._migrate_legacy_tables(c)
+            
+            # Also restores indexes left dropped by an interrupted bulk_load()
+            self._create_indexes(c)
+            
+            # Created after any legacy migration so copied readings don't re-raise anomalies
+            c.execute(_SQL_ANOMALY_TRIGGER)
+    
+    def _create_indexes(self, c):
+        """Create the secondary indexes on readings and anomalies."""
+        c.execute('CREATE INDEX IF NOT EXISTS idx_readings_sensor_ts ON readings(sensor_id, timestamp)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_anomalies_ts ON anomalies(timestamp DESC)')
+    
+    def _drop_indexes(self, c):
+        """Drop the secondary indexes on readings and anomalies."""
+        c.execute('DROP INDEX IF EXISTS idx_readings_sensor_ts')
+        c.execute('DROP INDEX IF EXISTS idx_anomalies_ts')
+    
+    def _detach_legacy_tables(self, c) -> bool:
+        """Rename tables that still store ISO-string timestamps out of the way."""
+        c.execute("SELECT type FROM pragma_table_info('readings') WHERE name = 'timestamp'")
+        row = c.fetchone()
+        if not row or row[0] != 'TEXT':
+            return False
+        
+        self._drop_indexes(c)
+        for table in ('sensors', 'readings', 'anomalies'):
+            c.execute(f'ALTER TABLE {table} RENAME TO {table}_legacy')
+        return True
+    
+    def _migrate_legacy_tables(self, c):
+        """Copy legacy rows into the new tables, converting timestamps to epoch microseconds."""
+        # Legacy timestamps are naive local-time isoformat() strings; parse them
+        # in Python, as julianday() would round to milliseconds
+        self._conn.create_function('iso_to_us', 1, _iso_to_us, deterministic=True)
+        to_us = 'iso_to_us({})'
+        c.execute(f'''INSERT INTO sensors
+                     SELECT id, name, type, lat, lon, depth_m, status, {to_us.format('last_reading_ts')}
+                     FROM sensors_legacy''')
+        c.execute(f'''INSERT INTO readings
+                     SELECT id, sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m,
+                            {to_us.format('timestamp')}
+                     FROM readings_legacy''')
+        c.execute(f'''INSERT INTO anomalies
+                     SELECT id, sensor_id, type, value, severity, {to_us.format('timestamp')}
+                     FROM anomalies_legacy''')
+        for table in ('anomalies', 'readings', 'sensors'):
+            c.execute(f'DROP TABLE {table}_legacy')
     
     def _initialize_demo_sensors(self):
         """Initialize demo sensors if not already present."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('SELECT COUNT(*) FROM sensors')
-        if c.fetchone()[0] == 0:
+        with self._transaction() as c:
+            c.execute(_SQL_COUNT_SENSORS)
+            if c.fetchone()[0] > 0:
+                return
+            
             demo_sensors = [
                 ('S_PACIFIC_01', 'Pacific Buoy', 'buoy', 35.5, -120.3, 4000, 'active'),
                 ('S_ATLANTIC_01', 'Atlantic Mooring', 'mooring', 45.2, -30.1, 5000, 'active'),
                 ('S_ARCTIC_01', 'Arctic Glider', 'glider', 78.5, 15.2, 3000, 'active'),
             ]
             
-            for sensor_id, name, type_, lat, lon, depth, status in demo_sensors:
-                c.execute('''INSERT INTO sensors VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                         (sensor_id, name, type_, lat, lon, depth, status, None))
-            
-            conn.commit()
-        
-        conn.close()
+            c.executemany(_SQL_INSERT_SENSOR, [sensor + (None,) for sensor in demo_sensors])
     
     def deploy_sensor(self, name: str, type_: str, lat: float, lon: float, depth_m: float) -> OceanSensor:
         """Deploy a new sensor."""
-        if type_ not in [t.value for t in SensorType]:
-            raise ValueError(f"Invalid type. Must be one of {[t.value for t in SensorType]}")
+        if type_ not in _SENSOR_TYPE_VALUES:
+            raise ValueError(f"Invalid type. Must be one of {list(_SENSOR_TYPE_LIST)}")
         
         sensor_id = f"S_{uuid.uuid4().hex[:8].upper()}"
         
@@ -135,133 +397,148 @@ class OceanDataCollector:
             last_reading_ts=None
         )
         
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''INSERT INTO sensors VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                 (sensor.id, sensor.name, sensor.type, sensor.lat, sensor.lon, 
-                  sensor.depth_m, sensor.status, sensor.last_reading_ts))
-        conn.commit()
-        conn.close()
+        with self._transaction() as c:
+            c.execute(_SQL_INSERT_SENSOR,
+                     (sensor.id, sensor.name, sensor.type, sensor.lat, sensor.lon, 
+                      sensor.depth_m, sensor.status, sensor.last_reading_ts))
         
         return sensor
     
     def ingest_reading(self, sensor_id: str, temp: float, salinity: float, ph: float,
                       o2: float, current: float = 0, depth: Optional[float] = None) -> OceanReading:
         """Ingest a new sensor reading."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        # Get sensor info
-        c.execute('SELECT * FROM sensors WHERE id = ?', (sensor_id,))
-        sensor_row = c.fetchone()
-        if not sensor_row:
-            conn.close()
-            raise ValueError(f"Sensor {sensor_id} not found")
-        
-        depth = depth or sensor_row[5]
-        timestamp = datetime.now().isoformat()
-        
-        # Insert reading
-        c.execute('''INSERT INTO readings (sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                 (sensor_id, temp, salinity, ph, o2, current, depth, timestamp))
-        
-        # Update sensor last reading
-        c.execute('UPDATE sensors SET last_reading_ts = ? WHERE id = ?', (timestamp, sensor_id))
-        
-        # Check for anomalies
-        self._check_anomalies(c, sensor_id, temp, ph, o2, timestamp)
-        
-        conn.commit()
-        conn.close()
-        
-        return OceanReading(sensor_id, temp, salinity, ph, o2, current, depth, timestamp)
+        rows = self._write_readings([(sensor_id, temp, salinity, ph, o2, current, depth, _now_us())])
+        return OceanReading._make(rows[0])
     
-    def _check_anomalies(self, cursor, sensor_id: str, temp: float, ph: float, o2: float, timestamp: str):
-        """Check for environmental anomalies."""
-        if temp > 30:
-            cursor.execute('''INSERT INTO anomalies (sensor_id, type, value, severity, timestamp)
-                            VALUES (?, ?, ?, ?, ?)''',
-                          (sensor_id, 'high_temperature', temp, 'warning', timestamp))
-        
-        if ph < 7.8:
-            cursor.execute('''INSERT INTO anomalies (sensor_id, type, value, severity, timestamp)
-                            VALUES (?, ?, ?, ?, ?)''',
-                          (sensor_id, 'ocean_acidification', ph, 'critical', timestamp))
+    @contextmanager
+    def buffered_ingestion(self, batch_size: int = 100):
+        """Yield a ReadingBuffer whose readings are committed batch_size at a time.
+        
+        Readings still queued when the block exits are flushed, even if the
+        block raised.
+        """
+        buffer = ReadingBuffer(self, batch_size)
+        try:
+            yield buffer
+        finally:
+            buffer.flush()
+    
+    @contextmanager
+    def bulk_load(self, batch_size: int = 10_000):
+        """Like buffered_ingestion(), with secondary indexes dropped until exit.
+        
+        Rebuilding an index once in a sorted pass is cheaper than updating it
+        per row when loading historical data.
+        """
+        with self._transaction() as c:
+            self._drop_indexes(c)
+        try:
+            with self.buffered_ingestion(batch_size) as buffer:
+                yield buffer
+        finally:
+            # Reclaim the WAL the load produced before rebuilding the indexes
+            self._checkpoint('TRUNCATE')
+            with self._transaction() as c:
+                self._create_indexes(c)
+    
+    def _sensor_exists(self, sensor_id: str) -> bool:
+        """Whether a sensor with this id is deployed."""
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_SENSOR_EXISTS, (sensor_id,))
+            return c.fetchone() is not None
+    
+    def _write_readings(self, readings: List[Tuple]) -> List[Tuple]:
+        """Insert readings and update sensor timestamps in one transaction.
+        
+        Anomalies are recorded by readings_anomaly_trigger as rows are inserted.
+        """
+        sensor_ids = {r[0] for r in readings}
+        
+        with self._transaction() as c:
+            # Get sensor info
+            c.execute(_SQL_SENSOR_DEPTHS.format(_placeholders(len(sensor_ids))), tuple(sensor_ids))
+            sensor_depths = dict(c.fetchall())
+            for sensor_id in sensor_ids:
+                if sensor_id not in sensor_depths:
+                    raise ValueError(f"Sensor {sensor_id} not found")
+            
+            rows = []
+            last_reading_ts = {}
+            for sensor_id, temp, salinity, ph, o2, current, depth, timestamp in readings:
+                depth = depth or sensor_depths[sensor_id]
+                rows.append((sensor_id, temp, salinity, ph, o2, current, depth, timestamp))
+                last_reading_ts[sensor_id] = max(timestamp, last_reading_ts.get(sensor_id, timestamp))
+            
+            # Insert readings
+            c.executemany(_SQL_INSERT_READING, rows)
+            
+            # Update sensor last reading
+            c.executemany(_SQL_UPDATE_SENSOR_TS,
+                          [(timestamp, sensor_id) for sensor_id, timestamp in last_reading_ts.items()])
         
-        if o2 < 4:
-            cursor.execute('''INSERT INTO anomalies (sensor_id, type, value, severity, timestamp)
-                            VALUES (?, ?, ?, ?, ?)''',
-                          (sensor_id, 'hypoxia', o2, 'critical', timestamp))
+        return rows
     
     def get_latest(self, sensor_id: str) -> Optional[OceanReading]:
         """Get latest reading for a sensor."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('''SELECT sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp
-                    FROM readings WHERE sensor_id = ? ORDER BY timestamp DESC LIMIT 1''', (sensor_id,))
-        row = c.fetchone()
-        conn.close()
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_LATEST, (sensor_id,))
+            row = c.fetchone()
         
         if not row:
             return None
         
-        return OceanReading(*row)
+        return OceanReading._make(row)
     
     def get_history(self, sensor_id: str, hours: int = 24) -> List[OceanReading]:
         """Get reading history."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        cutoff = datetime.now() - timedelta(hours=hours)
+        cutoff = _now_us() - hours * _US_PER_HOUR
         
-        c.execute('''SELECT sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, current_ms, depth_m, timestamp
-                    FROM readings WHERE sensor_id = ? AND timestamp > ? ORDER BY timestamp DESC''',
-                 (sensor_id, cutoff.isoformat()))
-        rows = c.fetchall()
-        conn.close()
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_HISTORY, (sensor_id, cutoff))
+            rows = c.fetchall()
         
-        return [OceanReading(*row) for row in rows]
+        return [OceanReading._make(row) for row in rows]
     
     def fleet_status(self) -> List[Dict]:
         """Get status of all sensors."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('SELECT * FROM sensors')
-        sensors = c.fetchall()
-        
-        status_list = []
-        for sensor in sensors:
-            latest = self.get_latest(sensor[0])
-            status_list.append({
-                "id": sensor[0],
-                "name": sensor[1],
-                "type": sensor[2],
-                "lat": sensor[3],
-                "lon": sensor[4],
-                "depth_m": sensor[5],
-                "status": sensor[6],
-                "last_reading": latest.__dict__ if latest else None
-            })
-        
-        conn.close()
-        return status_list
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_FLEET_LATEST)
+            rows = c.fetchall()
+        
+        return [
+            dict(zip(_FLEET_SENSOR_KEYS, row[:7]),
+                 last_reading=dict(zip(OceanReading._fields, row[7:])) if row[7] is not None else None)
+            for row in rows
+        ]
+    
+    def reclassify_all(self) -> int:
+        """Rebuild the anomalies table from every stored reading.
+        
+        Applies the same thresholds as readings_anomaly_trigger, as one
+        set-based statement over the whole readings table. Returns the
+        number of anomalies recorded.
+        """
+        with self._transaction() as c:
+            c.execute(_SQL_CLEAR_ANOMALIES)
+            c.execute(_SQL_RECLASSIFY_ANOMALIES)
+            return c.rowcount
     
     def detect_anomalies(self) -> List[Dict]:
         """Get current anomalies."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
         # Recent anomalies (last 24 hours)
-        cutoff = datetime.now() - timedelta(hours=24)
+        cutoff = _now_us() - 24 * _US_PER_HOUR
         
-        c.execute('''SELECT sensor_id, type, value, severity, timestamp FROM anomalies 
-                    WHERE timestamp > ? ORDER BY timestamp DESC''', (cutoff.isoformat(),))
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_RECENT_ANOMALIES, (cutoff,))
+            rows = c.fetchall()
         
         anomalies = []
-        for row in c.fetchall():
+        for row in rows:
             anomalies.append({
                 "sensor_id": row[0],
                 "type": row[1],
@@ -270,21 +547,15 @@ class OceanDataCollector:
                 "timestamp": row[4]
             })
         
-        conn.close()
         return anomalies
     
     def calculate_heat_content(self, sensor_ids: List[str]) -> Dict:
         """Calculate integrated ocean heat content."""
-        total_heat = 0
-        readings_count = 0
-        
-        for sensor_id in sensor_ids:
-            latest = self.get_latest(sensor_id)
-            if latest:
-                # Simplified heat content estimation
-                heat = latest.temperature_c * latest.depth_m * 4186 / 1000  # kJ/m²
-                total_heat += heat
-                readings_count += 1
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_HEAT_TOTAL.format(_placeholders(len(sensor_ids))), tuple(sensor_ids))
+            total_heat, readings_count = c.fetchone()
+        total_heat = total_heat or 0
         
         return {
             "total_heat_content_kj_m2": round(total_heat, 2),
@@ -292,29 +563,44 @@ class OceanDataCollector:
             "sensors_sampled": readings_count
         }
     
+    def heat_content_by_sensor(self, sensor_ids: List[str]) -> Dict[str, float]:
+        """Heat content (kJ/m²) of each sensor's latest reading, for sensors that have one.
+        
+        Values are unrounded so regrouped sums agree with calculate_heat_content.
+        """
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_HEAT_BY_SENSOR.format(_placeholders(len(sensor_ids))), tuple(sensor_ids))
+            return dict(c.fetchall())
+    
     def export_netcdf_stub(self, output_path: str):
         """Export data as structured JSON mimicking NetCDF."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
         # Get all sensors and recent readings
-        c.execute('SELECT * FROM sensors')
-        sensors = c.fetchall()
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_COUNT_SENSORS)
+            station_count = c.fetchone()[0]
+            c.execute(_SQL_EXPORT_LATEST)
+            rows = c.fetchall()
+        
+        # Transpose rows into one column per variable
+        columns = [list(col) for col in zip(*rows)] or [[] for _ in range(7)]
+        lat, lon, depth, temperature, salinity, ph, o2 = columns
         
         netcdf_stub = {
             "dimensions": {
                 "time": "unlimited",
-                "station": len(sensors)
+                "station": station_count
             },
             "variables": {
                 "time": {"units": "seconds since 2020-01-01", "data": []},
-                "lat": {"units": "degrees_north", "data": []},
-                "lon": {"units": "degrees_east", "data": []},
-                "depth": {"units": "meters", "data": []},
-                "temperature": {"units": "degC", "data": []},
-                "salinity": {"units": "PSU", "data": []},
-                "ph": {"units": "pH", "data": []},
-                "dissolved_oxygen": {"units": "mg/L", "data": []}
+                "lat": {"units": "degrees_north", "data": lat},
+                "lon": {"units": "degrees_east", "data": lon},
+                "depth": {"units": "meters", "data": depth},
+                "temperature": {"units": "degC", "data": temperature},
+                "salinity": {"units": "PSU", "data": salinity},
+                "ph": {"units": "pH", "data": ph},
+                "dissolved_oxygen": {"units": "mg/L", "data": o2}
             },
             "metadata": {
                 "title": "BlackRoad Ocean Data Collection",
@@ -323,21 +609,12 @@ class OceanDataCollector:
             }
         }
         
-        for sensor in sensors:
-            latest = self.get_latest(sensor[0])
-            if latest:
-                netcdf_stub["variables"]["lat"]["data"].append(sensor[3])
-                netcdf_stub["variables"]["lon"]["data"].append(sensor[4])
-                netcdf_stub["variables"]["depth"]["data"].append(latest.depth_m)
-                netcdf_stub["variables"]["temperature"]["data"].append(latest.temperature_c)
-                netcdf_stub["variables"]["salinity"]["data"].append(latest.salinity_psu)
-                netcdf_stub["variables"]["ph"]["data"].append(latest.ph)
-                netcdf_stub["variables"]["dissolved_oxygen"]["data"].append(latest.dissolved_o2_mgl)
-        
-        conn.close()
-        
-        with open(output_path, 'w') as f:
-            json.dump(netcdf_stub, f, indent=2)
+        if orjson is not None:
+            with open(output_path, 'wb') as f:
+                f.write(orjson.dumps(netcdf_stub))
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(netcdf_stub, f, separators=(',', ':'), ensure_ascii=False)
     
     def heatmap_ascii(self, parameter: str = "temperature") -> str:
         """Generate ASCII heatmap of readings."""
@@ -346,9 +623,14 @@ class OceanDataCollector:
         if not fleet or not any(s["last_reading"] for s in fleet):
             return "No data available"
         
-        # Create simple grid
-        lats = sorted(set(s["lat"] for s in fleet))
-        lons = sorted(set(s["lon"] for s in fleet))
+        # One pass over the fleet; the first sensor at a position wins
+        by_position = {}
+        for s in fleet:
+            by_position.setdefault((s["lat"], s["lon"]), s)
+        
+        # Create simple grid from the distinct positions
+        lats = sorted({lat for lat, _ in by_position})
+        lons = sorted({lon for _, lon in by_position})
         
         grid = []
         header = "    " + "".join(f"{lon:>6.1f}" for lon in lons)
@@ -357,7 +639,7 @@ class OceanDataCollector:
         for lat in reversed(lats):
             row = f"{lat:>3.1f}"
             for lon in lons:
-                sensor = next((s for s in fleet if s["lat"] == lat and s["lon"] == lon), None)
+                sensor = by_position.get((lat, lon))
                 if sensor and sensor["last_reading"]:
                     if parameter == "temperature":
                         val = sensor["last_reading"]["temperature_c"]
@@ -376,23 +658,26 @@ class OceanDataCollector:
     
     def alert_summary(self) -> str:
         """Generate alert summary."""
-        anomalies = self.detect_anomalies()
+        cutoff = _now_us() - 24 * _US_PER_HOUR
         
-        if not anomalies:
-            return "✓ No active anomalies"
+        with self._lock:
+            c = self._conn.cursor()
+            c.execute(_SQL_COUNT_RECENT_ANOMALIES, (cutoff,))
+            total = c.fetchone()[0]
+            c.execute(_SQL_TOP_ANOMALIES_BY_SEVERITY, (cutoff,))
+            rows = c.fetchall()
         
-        summary = f"⚠ {len(anomalies)} anomalies detected:\n"
+        if not total:
+            return "✓ No active anomalies"
         
-        by_severity = {}
-        for anom in anomalies:
-            sev = anom["severity"]
-            by_severity.setdefault(sev, []).append(anom)
+        summary = f"⚠ {total} anomalies detected:\n"
         
-        for sev in ["critical", "warning", "info"]:
-            if sev in by_severity:
+        current_sev = None
+        for sensor_id, type_, value, sev in rows:
+            if sev != current_sev:
+                current_sev = sev
                 summary += f"\n  {sev.upper()}:\n"
-                for anom in by_severity[sev][:3]:
-                    summary += f"    • {anom['type']}: {anom['value']:.2f} ({anom['sensor_id']})\n"
+            summary += f"    • {type_}: {value:.2f} ({sensor_id})\n"
         
         return summary
 
@@ -424,15 +709,20 @@ def main():
     
     if args.command == "fleet":
         fleet = collector.fleet_status()
+        for sensor in fleet:
+            if sensor["last_reading"]:
+                sensor["last_reading"]["timestamp"] = _iso(sensor["last_reading"]["timestamp"])
         print(f"✓ Fleet Status ({len(fleet)} sensors):")
-        print(json.dumps(fleet, indent=2, default=str))
+        print(_dumps_pretty(fleet))
     
     elif args.command == "anomalies":
         print(collector.alert_summary())
         anomalies = collector.detect_anomalies()
         if anomalies:
+            for anom in anomalies:
+                anom["timestamp"] = _iso(anom["timestamp"])
             print("\nDetailed anomalies:")
-            print(json.dumps(anomalies, indent=2, default=str))
+            print(_dumps_pretty(anomalies))
     
     elif args.command == "heatmap":
         print(f"\n{args.parameter.upper()} Heatmap:")
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import ocean_collector  # noqa: E402
+
+
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocean_collector, "DB_PATH", str(tmp_path / "ocean.db"))
+    c = ocean_collector.OceanDataCollector()
+    yield c
+    c.close()
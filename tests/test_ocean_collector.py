@@ -0,0 +1,212 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+import ocean_collector
+
+
+def _reading_count(collector, sensor_id):
+    return len(collector.get_history(sensor_id))
+
+
+def test_buffered_ingestion_rejects_unknown_sensor_without_poisoning_batch(collector):
+    with collector.buffered_ingestion(batch_size=2) as buf:
+        buf.add("S_ARCTIC_01", 2.0, 34.0, 8.0, 7.0)
+        with pytest.raises(ValueError, match="Sensor NOPE not found"):
+            buf.add("NOPE", 2.0, 34.0, 8.0, 7.0)
+        for _ in range(4):
+            buf.add("S_ARCTIC_01", 2.0, 34.0, 8.0, 7.0)
+
+    assert _reading_count(collector, "S_ARCTIC_01") == 5
+
+
+def test_buffered_ingestion_flushes_pending_readings_when_body_raises(collector):
+    with pytest.raises(RuntimeError):
+        with collector.buffered_ingestion(batch_size=100) as buf:
+            buf.add("S_ARCTIC_01", 2.0, 34.0, 8.0, 7.0)
+            buf.add("S_ARCTIC_01", 3.0, 34.0, 8.0, 7.0)
+            raise RuntimeError("boom")
+
+    assert _reading_count(collector, "S_ARCTIC_01") == 2
+
+
+def test_legacy_text_timestamps_are_migrated_exactly(tmp_path, monkeypatch):
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    # Schema as created by the original TEXT-timestamp release
+    conn.executescript('''
+        CREATE TABLE sensors (id TEXT PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL,
+            lat REAL NOT NULL, lon REAL NOT NULL, depth_m REAL NOT NULL, status TEXT NOT NULL,
+            last_reading_ts TEXT);
+        CREATE TABLE readings (id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_id TEXT NOT NULL,
+            temperature_c REAL NOT NULL, salinity_psu REAL NOT NULL, ph REAL NOT NULL,
+            dissolved_o2_mgl REAL NOT NULL, current_ms REAL NOT NULL, depth_m REAL NOT NULL,
+            timestamp TEXT NOT NULL, FOREIGN KEY(sensor_id) REFERENCES sensors(id));
+        CREATE TABLE anomalies (id INTEGER PRIMARY KEY AUTOINCREMENT, sensor_id TEXT NOT NULL,
+            type TEXT NOT NULL, value REAL NOT NULL, severity TEXT NOT NULL,
+            timestamp TEXT NOT NULL, FOREIGN KEY(sensor_id) REFERENCES sensors(id));
+    ''')
+    first = "2026-10-15T21:02:35.001453"
+    second = "2026-10-15T21:02:35.001901"
+    conn.execute("INSERT INTO sensors VALUES ('S_LEGACY', 'Legacy Buoy', 'buoy', 1.0, 2.0, 100.0, 'active', ?)",
+                 (second,))
+    conn.executemany("INSERT INTO readings (sensor_id, temperature_c, salinity_psu, ph, dissolved_o2_mgl, "
+                     "current_ms, depth_m, timestamp) VALUES ('S_LEGACY', ?, 34.0, 8.1, 6.0, 0.0, 100.0, ?)",
+                     [(31.0, first), (12.0, second)])
+    conn.execute("INSERT INTO anomalies (sensor_id, type, value, severity, timestamp) "
+                 "VALUES ('S_LEGACY', 'high_temperature', 31.0, 'warning', ?)", (first,))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(ocean_collector, "DB_PATH", str(db_path))
+    collector = ocean_collector.OceanDataCollector()
+    try:
+        def to_us(text):
+            dt = datetime.fromisoformat(text)
+            return int(dt.replace(microsecond=0).timestamp()) * 1_000_000 + dt.microsecond
+
+        c = collector._conn
+        assert [r[0] for r in c.execute("SELECT timestamp FROM readings ORDER BY id")] == \
+            [to_us(first), to_us(second)]
+        assert c.execute("SELECT last_reading_ts FROM sensors WHERE id = 'S_LEGACY'").fetchone()[0] == to_us(second)
+        assert [r[0] for r in c.execute("SELECT timestamp FROM anomalies")] == [to_us(first)]
+        assert ocean_collector._iso(to_us(first)) == first
+
+        latest = collector.get_latest("S_LEGACY")
+        assert latest.temperature_c == 12.0
+        assert collector.fleet_status()[0]["last_reading"]["timestamp"] == to_us(second)
+
+        objects = {r[0] for r in c.execute("SELECT name FROM sqlite_master")}
+        assert {"idx_readings_sensor_ts", "idx_anomalies_ts", "readings_anomaly_trigger"} <= objects
+        assert not any(name.endswith("_legacy") for name in objects)
+        # Copied readings must not have re-raised anomalies through the trigger
+        assert c.execute("SELECT COUNT(*) FROM anomalies").fetchone()[0] == 1
+
+        collector.ingest_reading("S_LEGACY", 31.0, 34.0, 8.1, 6.0)
+        assert c.execute("SELECT COUNT(*) FROM anomalies").fetchone()[0] == 2
+    finally:
+        collector.close()
+
+
+def test_bulk_load_keeps_archive_timestamps_and_latest_reading(collector):
+    current = collector.ingest_reading("S_ATLANTIC_01", 12.0, 35.0, 8.1, 6.0)
+    week_us = 7 * 24 * ocean_collector._US_PER_HOUR
+    archive_start = current.timestamp - week_us
+
+    with collector.bulk_load(batch_size=3) as buf:
+        # Out of order on purpose; an anomalous archive reading too
+        for i in (2, 0, 4, 1, 3):
+            buf.add("S_ATLANTIC_01", 31.0 + i, 35.0, 8.1, 6.0, timestamp=archive_start + i)
+
+    history = collector.get_history("S_ATLANTIC_01", hours=24 * 8)
+    assert sorted(r.timestamp for r in history) == [archive_start + i for i in range(5)] + [current.timestamp]
+
+    # The live reading is still the latest and archive anomalies are outside the 24h window
+    assert collector.get_latest("S_ATLANTIC_01") == current
+    fleet = {s["id"]: s for s in collector.fleet_status()}
+    assert fleet["S_ATLANTIC_01"]["last_reading"]["temperature_c"] == 12.0
+    assert collector.detect_anomalies() == []
+
+    # A sensor with only archive data reports its newest archive reading
+    with collector.bulk_load() as buf:
+        buf.add("S_ARCTIC_01", 3.0, 34.0, 8.0, 7.0, timestamp=archive_start + 10)
+        buf.add("S_ARCTIC_01", 1.0, 34.0, 8.0, 7.0, timestamp=archive_start)
+    fleet = {s["id"]: s for s in collector.fleet_status()}
+    assert fleet["S_ARCTIC_01"]["last_reading"]["timestamp"] == archive_start + 10
+
+
+def test_export_netcdf_stub_without_readings_has_independent_arrays(collector, tmp_path):
+    output = tmp_path / "export.json"
+    collector.export_netcdf_stub(str(output))
+    variables = json.loads(output.read_text())["variables"]
+    assert all(v["data"] == [] for v in variables.values())
+
+    collector.ingest_reading("S_PACIFIC_01", 18.0, 34.5, 8.1, 6.2)
+    collector.export_netcdf_stub(str(output))
+    variables = json.loads(output.read_text())["variables"]
+    assert variables["temperature"]["data"] == [18.0]
+    assert variables["lat"]["data"] == [35.5]
+
+
+def test_reclassify_all_matches_live_anomalies(collector):
+    collector.ingest_reading("S_PACIFIC_01", 31.0, 34.5, 7.7, 3.5)
+    collector.ingest_reading("S_ATLANTIC_01", 12.0, 35.5, 7.5, 6.0)
+    collector.ingest_reading("S_ARCTIC_01", 2.0, 34.0, 8.1, 7.0)
+    query = "SELECT id, sensor_id, type, value, severity, timestamp FROM anomalies ORDER BY id"
+    live = [row[1:] for row in collector._conn.execute(query)]
+    summary = collector.alert_summary()
+
+    assert collector.reclassify_all() == 4
+    assert [row[1:] for row in collector._conn.execute(query)] == live
+    assert collector.alert_summary() == summary
+
+
+def test_pretty_json_output_does_not_depend_on_orjson(monkeypatch):
+    fleet = [{"name": "Bouée Sud", "lat": 1.5}]
+    native = ocean_collector._dumps_pretty(fleet)
+    monkeypatch.setattr(ocean_collector, "orjson", None)
+    fallback = ocean_collector._dumps_pretty(fleet)
+
+    assert '"Bouée Sud"' in fallback
+    assert fallback == native
+
+
+def test_write_waits_for_concurrent_writer_instead_of_failing(collector):
+    other = sqlite3.connect(collector.db_path, check_same_thread=False, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    other.execute("INSERT INTO sensors VALUES ('S_OTHER', 'Other', 'buoy', 0, 0, 10, 'active', NULL)")
+
+    def commit_later():
+        time.sleep(0.2)
+        other.execute("COMMIT")
+
+    committer = threading.Thread(target=commit_later)
+    committer.start()
+    try:
+        collector.ingest_reading("S_PACIFIC_01", 18.0, 34.5, 8.1, 6.2)
+    finally:
+        committer.join()
+        other.close()
+
+    assert collector.get_latest("S_PACIFIC_01").temperature_c == 18.0
+
+
+def test_failed_flush_keeps_readings_for_retry(collector, monkeypatch):
+    write_readings = collector._write_readings
+    calls = []
+
+    def busy_once(readings):
+        calls.append(len(readings))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return write_readings(readings)
+
+    monkeypatch.setattr(collector, "_write_readings", busy_once)
+    with collector.buffered_ingestion(batch_size=2) as buf:
+        buf.add("S_ARCTIC_01", 2.0, 34.0, 8.0, 7.0)
+        with pytest.raises(sqlite3.OperationalError):
+            buf.add("S_ARCTIC_01", 3.0, 34.0, 8.0, 7.0)
+        buf.add("S_ARCTIC_01", 4.0, 34.0, 8.0, 7.0)
+
+    assert calls == [2, 3]
+    assert _reading_count(collector, "S_ARCTIC_01") == 3
+
+
+def test_heat_content_by_sensor_adds_up_to_total(collector):
+    collector.ingest_reading("S_PACIFIC_01", 18.25, 34.5, 8.1, 6.2, depth=0.5)
+    collector.ingest_reading("S_ATLANTIC_01", 12.125, 35.0, 8.1, 6.0, depth=0.7)
+    sensor_ids = ["S_PACIFIC_01", "S_ATLANTIC_01", "S_ARCTIC_01"]
+
+    per_sensor = collector.heat_content_by_sensor(sensor_ids)
+    total = collector.calculate_heat_content(sensor_ids)
+
+    # S_ARCTIC_01 has no readings and is left out
+    assert set(per_sensor) == {"S_PACIFIC_01", "S_ATLANTIC_01"}
+    assert per_sensor["S_PACIFIC_01"] == pytest.approx(18.25 * 0.5 * 4.186)
+    assert round(sum(per_sensor.values()), 2) == total["total_heat_content_kj_m2"]
+    assert total["sensors_sampled"] == 2
+    assert collector.heat_content_by_sensor([]) == {}